@@ -1,60 +1,155 @@
 """
 데이터베이스 스키마 추출을 위한 공통 유틸리티
 """
-from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
+import hashlib
+import os
+import pickle
+import re
+import numpy as np
+import pandas as pd
 from datetime import datetime
 
-def apply_sheet_style(worksheet, df, startrow=0):
-    """워크시트에 스타일을 적용합니다."""
-    # 헤더 스타일 정의
-    header_fill = PatternFill(start_color='BFBFBF', end_color='BFBFBF', fill_type='solid')
-    header_font = Font(bold=True, color='000000')
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+# 대량 메타데이터 조회 시 한 번에 가져올 행 수
+FETCH_SIZE = 10_000
+
+# 스키마 메타데이터 디스크 캐시 위치
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'schema_excel')
+# 캐시에 담는 조회 결과의 형식이 바뀌면 올려서 이전 캐시를 무효화
+CACHE_FORMAT = 2
+
+# xlsxwriter Workbook 옵션 (constant_memory: 행 단위로 바로 기록하여 메모리 사용 최소화)
+WORKBOOK_OPTIONS = {
+    'constant_memory': True,
+    'strings_to_urls': False,
+    'strings_to_formulas': False
+}
+
+# 셀 스타일 (xlsxwriter 포맷 속성)
+HEADER_STYLE = {
+    'bg_color': '#BFBFBF',
+    'font_color': '#000000',
+    'bold': True,
+    'align': 'center',
+    'valign': 'vcenter',
+    'border': 1
+}
+DATA_STYLE = {'align': 'left', 'valign': 'vcenter', 'border': 1}
+STRIPE_STYLE = {**DATA_STYLE, 'bg_color': '#F2F2F2'}
+BACK_LINK_STYLE = {'font_color': '#0563C1', 'underline': 1, 'align': 'left', 'valign': 'vcenter'}
+
+def create_sheet_formats(workbook):
+    """워크북에 시트 스타일용 포맷을 한 번만 등록하고 반환합니다."""
+    return {
+        'header': workbook.add_format(HEADER_STYLE),
+        'data': workbook.add_format(DATA_STYLE),
+        'stripe': workbook.add_format(STRIPE_STYLE),
+        'back_link': workbook.add_format(BACK_LINK_STYLE)
+    }
+
+def apply_sheet_style(worksheet, df, formats, startrow=0):
+    """
+    워크시트에 데이터를 기록하면서 스타일을 적용합니다.
     
+    constant_memory 모드에서는 이미 기록한 행을 다시 수정할 수 없으므로
+    값과 서식을 행 단위로 한 번에 기록합니다.
+    """
     if not df.empty:
         # 헤더 추가
-        for idx, col in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=startrow + 1, column=idx)
-            cell.value = col
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
+        worksheet.set_row(startrow, 25)  # 헤더 행 높이
+        worksheet.write_row(startrow, 0, df.columns, formats['header'])
         
-        # 데이터 추가
-        for r_idx, row in enumerate(df.values, startrow + 2):
-            for c_idx, value in enumerate(row, 1):
-                cell = worksheet.cell(row=r_idx, column=c_idx)
-                cell.value = value
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-                cell.border = thin_border
-                
-                # 줄무늬 스타일
-                if r_idx % 2 == 0:
-                    cell.fill = PatternFill(start_color='F2F2F2', end_color='F2F2F2', fill_type='solid')
+        # 데이터 추가 (결측값은 빈 셀로 기록)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False)
+        for r_idx, row in enumerate(rows, startrow + 1):
+            # 줄무늬 스타일 (Excel 기준 짝수 행)
+            row_format = formats['stripe'] if (r_idx + 1) % 2 == 0 else formats['data']
+            worksheet.set_row(r_idx, 20)  # 데이터 행 높이
+            worksheet.write_row(r_idx, 0, row, row_format)
         
         # 컬럼 너비 자동 조정
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        # 행 높이 설정
-        worksheet.row_dimensions[startrow + 1].height = 25  # 헤더 행 높이
-        for row in range(startrow + 2, worksheet.max_row + 1):
-            worksheet.row_dimensions[row].height = 20  # 데이터 행 높이
+        for idx, max_length in enumerate(get_column_widths(df)):
+            worksheet.set_column(idx, idx, max_length + 2)
+
+def read_dataframe(chunks, columns):
+    """
+    행 묶음 단위로 DataFrame을 만들어 이어 붙입니다.
+    
+    전체 결과를 행 객체 목록으로 한 번에 메모리에 올리지 않고,
+    FETCH_SIZE 행씩 변환한 뒤 해당 행 객체는 바로 해제합니다.
+    """
+    frames = [pd.DataFrame.from_records(rows, columns=columns) for rows in chunks]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def get_column_widths(df):
+    """컬럼별 최대 글자 수(헤더 포함)를 셀 단위 반복 없이 계산합니다."""
+    value_lengths = df.apply(lambda column: column.dropna().astype(str).str.len().max()).fillna(0)
+    return np.maximum(df.columns.str.len().values, value_lengths.values).astype(int)
+
+def get_cache_path(target, schema, schema_version):
+    """
+    메타데이터 캐시 파일 경로를 만듭니다.
+    
+    Args:
+        target (str): 접속 대상 (호스트, DB 이름 등)
+        schema (str): 스키마 이름
+        schema_version: 스키마 변경 여부를 판단할 값 (마지막 DDL 시각 등)
+    """
+    version_hash = hashlib.sha1(repr((CACHE_FORMAT, schema_version)).encode('utf-8')).hexdigest()[:16]
+    prefix = re.sub(r'[^\w.-]', '_', f"{target}_{schema}")
+    return os.path.join(CACHE_DIR, f"{prefix}_{version_hash}.pkl")
+
+def load_cached_metadata(cache_path):
+    """캐시 파일에서 메타데이터를 읽습니다. 캐시가 없거나 읽을 수 없으면 None을 반환합니다."""
+    if not os.path.exists(cache_path):
+        return None
+    
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # 손상되었거나 다른 버전의 pandas 등으로 저장되어 읽을 수 없는 캐시는
+        # (ModuleNotFoundError, TypeError 등) 무시하고 DB에서 다시 조회
+        return None
+
+def save_cached_metadata(cache_path, metadata):
+    """메타데이터를 캐시 파일로 저장합니다. 저장에 실패해도 명세서 생성은 계속합니다."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(metadata, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: 메타데이터 캐시를 저장하지 못했습니다. ({str(e)})")
+
+def get_sheet_names(names, reserved=()):
+    """
+    테이블 이름별로 워크북 안에서 겹치지 않는 시트 이름을 만듭니다.
+    
+    Excel 시트 이름은 31자까지이고 대소문자를 구분하지 않으므로, 잘라낸 이름이
+    이미 쓰였으면 '~2', '~3'처럼 번호를 붙입니다. 시트 이름에 쓸 수 없는
+    문자([]:*?/\\)는 '_'로 바꾸고 앞뒤 작은따옴표는 제거합니다.
+    
+    Args:
+        names (list): 테이블 이름 목록
+        reserved (tuple): 다른 용도로 쓰는 시트 이름 (목차 등)
+    
+    Returns:
+        dict: 테이블 이름 -> 시트 이름
+    """
+    used = {name.lower() for name in reserved}
+    sheet_names = {}
+    for name in names:
+        base = re.sub(r'[\[\]:*?/\\]', '_', name)[:31].strip("'") or '_'
+        sheet_name = base
+        suffix = 2
+        while sheet_name.lower() in used:
+            tag = f"~{suffix}"
+            sheet_name = base[:31 - len(tag)] + tag
+            suffix += 1
+        used.add(sheet_name.lower())
+        sheet_names[name] = sheet_name
+    return sheet_names
 
 def get_output_file_name(prefix):
     """타임스탬프가 포함된 출력 파일명을 생성합니다."""
@@ -1,117 +1,214 @@
 """
 오라클 데이터베이스 스키마를 Excel 명세서로 추출
 """
+import numpy as np
 import pandas as pd
+import xlsxwriter
 import oracledb
-from db_schema_utils import apply_sheet_style, get_output_file_name
-from openpyxl.styles import Font, Alignment
-
-def get_column_info(connection, table_name, owner):
-    """Get column information for a specific table using direct SQL queries"""
-    column_query = """
-        SELECT 
-            c.COLUMN_NAME,
-            c.DATA_TYPE,
-            CASE 
-                WHEN c.DATA_TYPE = 'NUMBER' AND c.DATA_PRECISION IS NOT NULL 
-                THEN c.DATA_PRECISION || ',' || c.DATA_SCALE
-                WHEN c.DATA_TYPE LIKE '%CHAR%' OR c.DATA_TYPE = 'NVARCHAR2'
-                THEN c.CHAR_LENGTH
-                ELSE NULL 
-            END as DATA_LENGTH,
-            c.NULLABLE,
-            CASE WHEN p.COLUMN_NAME IS NOT NULL THEN 'Y' ELSE 'N' END as IS_PRIMARY_KEY,
-            cc.COMMENTS
-        FROM ALL_TAB_COLUMNS c
-        LEFT JOIN (
-            SELECT cols.TABLE_NAME, cols.COLUMN_NAME
-            FROM ALL_CONSTRAINTS cons
-            JOIN ALL_CONS_COLUMNS cols ON cons.CONSTRAINT_NAME = cols.CONSTRAINT_NAME
-            WHERE cons.CONSTRAINT_TYPE = 'P'
-            AND cons.OWNER = :owner
-        ) p ON c.TABLE_NAME = p.TABLE_NAME AND c.COLUMN_NAME = p.COLUMN_NAME
-        LEFT JOIN ALL_COL_COMMENTS cc 
-            ON c.TABLE_NAME = cc.TABLE_NAME 
-            AND c.COLUMN_NAME = cc.COLUMN_NAME
-            AND cc.OWNER = :owner
-        WHERE c.TABLE_NAME = :table_name
-        AND c.OWNER = :owner
-        ORDER BY c.COLUMN_ID
-    """
-    
-    cursor = connection.cursor()
-    cursor.execute(column_query, {'table_name': table_name, 'owner': owner})
-    columns = cursor.fetchall()
-    
-    fk_query = """
-        SELECT 
-            cols.COLUMN_NAME,
-            cons.R_OWNER || '.' || cons.R_TABLE_NAME || '.' || rcols.COLUMN_NAME as REFERENCED_TABLE
+from concurrent.futures import ThreadPoolExecutor
+from db_schema_utils import (FETCH_SIZE, WORKBOOK_OPTIONS, apply_sheet_style, create_sheet_formats,
+                             get_cache_path, get_output_file_name, get_sheet_names, load_cached_metadata,
+                             read_dataframe, save_cached_metadata)
+
+# 스키마 메타데이터 동시 조회 수 (테이블/컬럼/FK/코멘트)
+METADATA_WORKERS = 4
+
+# 실행 중 조회한 스키마 메타데이터 캐시 ((사용자, DSN, 스키마 소유자) -> 조회 결과)
+_metadata_cache = {}
+
+COLUMN_QUERY = """
+    SELECT 
+        c.TABLE_NAME,
+        c.COLUMN_NAME,
+        c.DATA_TYPE || CASE 
+            WHEN c.DATA_TYPE = 'NUMBER' AND c.DATA_PRECISION IS NOT NULL 
+            THEN '(' || c.DATA_PRECISION || ',' || c.DATA_SCALE || ')'
+            WHEN c.DATA_TYPE LIKE '%CHAR%' OR c.DATA_TYPE = 'NVARCHAR2'
+            THEN '(' || c.CHAR_LENGTH || ')'
+        END as DATA_TYPE_FORMATTED,
+        c.NULLABLE,
+        CASE WHEN p.COLUMN_NAME IS NOT NULL THEN 'Y' ELSE 'N' END as IS_PRIMARY_KEY,
+        cc.COMMENTS
+    FROM ALL_TAB_COLUMNS c
+    LEFT JOIN (
+        SELECT cols.TABLE_NAME, cols.COLUMN_NAME
         FROM ALL_CONSTRAINTS cons
-        JOIN ALL_CONS_COLUMNS cols 
-            ON cons.CONSTRAINT_NAME = cols.CONSTRAINT_NAME
-            AND cons.OWNER = cols.OWNER
-        JOIN ALL_CONS_COLUMNS rcols 
-            ON cons.R_CONSTRAINT_NAME = rcols.CONSTRAINT_NAME
-            AND cons.R_OWNER = rcols.OWNER
-        WHERE cons.CONSTRAINT_TYPE = 'R'
+        JOIN ALL_CONS_COLUMNS cols ON cons.CONSTRAINT_NAME = cols.CONSTRAINT_NAME
+        WHERE cons.CONSTRAINT_TYPE = 'P'
         AND cons.OWNER = :owner
-        AND cons.TABLE_NAME = :table_name
-    """
+    ) p ON c.TABLE_NAME = p.TABLE_NAME AND c.COLUMN_NAME = p.COLUMN_NAME
+    LEFT JOIN ALL_COL_COMMENTS cc 
+        ON c.TABLE_NAME = cc.TABLE_NAME 
+        AND c.COLUMN_NAME = cc.COLUMN_NAME
+        AND cc.OWNER = :owner
+    WHERE c.OWNER = :owner
+    ORDER BY c.TABLE_NAME, c.COLUMN_ID
+"""
+
+def get_all_columns(connection, owner):
+    """Get column information for every table of the owner"""
+    cursor = create_cursor(connection)
+    cursor.execute(COLUMN_QUERY, {'owner': owner})
+    return fetch_dataframe(cursor)
+
+FK_QUERY = """
+    SELECT 
+        cons.TABLE_NAME,
+        cols.COLUMN_NAME,
+        cons.R_OWNER || '.' || cons.R_TABLE_NAME || '.' || rcols.COLUMN_NAME as REFERENCED_TABLE
+    FROM ALL_CONSTRAINTS cons
+    JOIN ALL_CONS_COLUMNS cols 
+        ON cons.CONSTRAINT_NAME = cols.CONSTRAINT_NAME
+        AND cons.OWNER = cols.OWNER
+    JOIN ALL_CONS_COLUMNS rcols 
+        ON cons.R_CONSTRAINT_NAME = rcols.CONSTRAINT_NAME
+        AND cons.R_OWNER = rcols.OWNER
+    WHERE cons.CONSTRAINT_TYPE = 'R'
+    AND cons.OWNER = :owner
+"""
+
+def get_all_foreign_keys(connection, owner):
+    """Get foreign key references for every table of the owner"""
+    cursor = create_cursor(connection)
+    cursor.execute(FK_QUERY, {'owner': owner})
+    fks = fetch_dataframe(cursor)
     
-    cursor.execute(fk_query, {'table_name': table_name, 'owner': owner})
-    fks = {row[0]: row[1] for row in cursor.fetchall()}
+    # 컬럼당 하나의 참조 정보만 표시
+    return fks.drop_duplicates(['TABLE_NAME', 'COLUMN_NAME'], keep='last')
+
+TABLE_COMMENT_QUERY = """
+    SELECT TABLE_NAME, COMMENTS
+    FROM ALL_TAB_COMMENTS
+    WHERE OWNER = :owner
+    AND COMMENTS IS NOT NULL
+"""
+
+def get_all_table_comments(connection, owner):
+    """Get table comments for every table of the owner"""
+    cursor = create_cursor(connection)
+    cursor.execute(TABLE_COMMENT_QUERY, {'owner': owner})
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+def build_column_info(columns, fks):
+    """Build column specification rows for the whole schema, indexed by table name"""
+    columns = columns.merge(fks, on=['TABLE_NAME', 'COLUMN_NAME'], how='left')
     
-    result = []
-    for col in columns:
-        col_name = col[0]
-        data_type = col[1]
-        data_length = col[2]
-        nullable = col[3]
-        is_pk = col[4]
-        comments = col[5] or ''
-        
-        type_with_length = f"{data_type}({data_length})" if data_length else data_type
-        fk_ref = fks.get(col_name, '')
-        
-        result.append({
-            '컬럼명': col_name,
-            '데이터 타입': type_with_length,
-            'Nullable': 'Y' if nullable == 'Y' else 'N',
-            'PK': is_pk,
-            'FK': 'Y' if fk_ref else 'N',
-            'FK 참조': fk_ref,
-            '설명': comments
-        })
+    fk_ref = columns['REFERENCED_TABLE'].fillna('')
     
-    return result
-
-def get_table_comment(connection, table_name, owner):
-    """Get table comment"""
-    query = """
-        SELECT COMMENTS
-        FROM ALL_TAB_COMMENTS
-        WHERE TABLE_NAME = :table_name
-        AND OWNER = :owner
-    """
+    return pd.DataFrame({
+        '컬럼명': columns['COLUMN_NAME'].values,
+        '데이터 타입': columns['DATA_TYPE_FORMATTED'].values,
+        'Nullable': np.where(columns['NULLABLE'] == 'Y', 'Y', 'N'),
+        'PK': columns['IS_PRIMARY_KEY'].values,
+        'FK': np.where(fk_ref != '', 'Y', 'N'),
+        'FK 참조': fk_ref.values,
+        '설명': columns['COMMENTS'].fillna('').values
+    }, index=columns['TABLE_NAME'].values)
+
+def create_cursor(connection):
+    """Create a cursor tuned for bulk metadata scans"""
     cursor = connection.cursor()
-    cursor.execute(query, {'table_name': table_name, 'owner': owner})
-    result = cursor.fetchone()
-    return result[0] if result and result[0] else ''
+    # 기본값(arraysize=100)은 대량 조회 시 왕복이 많으므로 한 번에 FETCH_SIZE 행씩 가져오고,
+    # 첫 왕복(execute)에서도 같은 양을 미리 가져오도록 설정
+    cursor.arraysize = FETCH_SIZE
+    cursor.prefetchrows = FETCH_SIZE + 1
+    return cursor
+
+def fetch_dataframe(cursor):
+    """Fetch the remaining rows of an executed cursor into a DataFrame, FETCH_SIZE rows at a time"""
+    return read_dataframe(iter(cursor.fetchmany, []), [d[0] for d in cursor.description])
+
+TABLE_QUERY = """
+    SELECT TABLE_NAME
+    FROM ALL_TABLES
+    WHERE OWNER = :owner
+    ORDER BY TABLE_NAME
+"""
 
 def get_tables(connection, owner):
     """Get all tables for the specified owner"""
-    query = """
-        SELECT TABLE_NAME
-        FROM ALL_TABLES
-        WHERE OWNER = :owner
-        ORDER BY TABLE_NAME
-    """
-    cursor = connection.cursor()
-    cursor.execute(query, {'owner': owner})
+    cursor = create_cursor(connection)
+    cursor.execute(TABLE_QUERY, {'owner': owner})
     return [row[0] for row in cursor.fetchall()]
 
-def create_table_specification(username, password, hostname, port, service_name, owner):
+def run_with_connection(pool, func, owner):
+    """Run a metadata query on its own connection acquired from the pool"""
+    with pool.acquire() as connection:
+        return func(connection, owner)
+
+SCHEMA_VERSION_QUERY = """
+    SELECT 
+        MAX(LAST_DDL_TIME),
+        COUNT(*),
+        SUM(ORA_HASH(OBJECT_ID || '/' || TO_CHAR(LAST_DDL_TIME, 'YYYYMMDDHH24MISS')))
+    FROM ALL_OBJECTS
+    WHERE OWNER = :owner
+"""
+
+def get_schema_version(connection, owner):
+    """
+    Get values used to detect schema changes of the owner's objects.
+    
+    The last DDL time alone does not change when an object other than the most
+    recently modified one is dropped, so the object count and a hash over the
+    object list are included as well.
+    """
+    cursor = create_cursor(connection)
+    cursor.execute(SCHEMA_VERSION_QUERY, {'owner': owner})
+    return tuple(cursor.fetchone())
+
+def load_schema_metadata(username, password, dsn, owner, use_cache=True):
+    """
+    Get schema metadata (tables, columns, foreign keys, table comments) for the owner.
+    
+    Repeated requests for the same DSN and owner within a run are served from
+    the cache without touching the database. If the schema has not changed since
+    the last run (see get_schema_version), the metadata is read from the disk cache.
+    Pass use_cache=False to skip both caches and always query the database.
+    """
+    cache_key = (username, dsn, owner)
+    if use_cache and cache_key in _metadata_cache:
+        return _metadata_cache[cache_key]
+    
+    # Thin 모드로 연결 (메타데이터를 동시에 조회하므로 조회 수만큼 연결 풀 구성)
+    pool = oracledb.create_pool(user=username,
+                                password=password,
+                                dsn=dsn,
+                                config_dir=None,
+                                lib_dir=None,
+                                min=1,
+                                max=METADATA_WORKERS,
+                                increment=1)
+    
+    try:
+        # 스키마가 바뀌지 않았으면 디스크 캐시 사용
+        # (ALL_* 뷰는 로그인 사용자가 볼 수 있는 객체만 보여주므로 사용자도 캐시 키에 포함)
+        metadata = None
+        if use_cache:
+            schema_version = run_with_connection(pool, get_schema_version, owner)
+            cache_path = get_cache_path(f"{username}@{dsn}", owner, schema_version)
+            metadata = load_cached_metadata(cache_path)
+        
+        # 컬럼/FK/코멘트 정보는 테이블별로 조회하지 않고 스키마 전체를 한 번에 조회하며,
+        # 각 조회는 서로 독립적이므로 스레드 풀에서 동시에 실행 (DB 대기 중에는 GIL 해제)
+        if metadata is None:
+            with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+                futures = {
+                    'tables': executor.submit(run_with_connection, pool, get_tables, owner),
+                    'columns': executor.submit(run_with_connection, pool, get_all_columns, owner),
+                    'fks': executor.submit(run_with_connection, pool, get_all_foreign_keys, owner),
+                    'table_comments': executor.submit(run_with_connection, pool, get_all_table_comments, owner)
+                }
+                metadata = {name: future.result() for name, future in futures.items()}
+            if use_cache:
+                save_cached_metadata(cache_path, metadata)
+    finally:
+        pool.close()
+    
+    _metadata_cache[cache_key] = metadata
+    return metadata
+
+def create_table_specification(username, password, hostname, port, service_name, owner, use_cache=True):
     """
     데이터베이스 스키마를 읽어서 Excel 형식의 테이블 명세서를 생성합니다.
     
@@ -122,48 +219,45 @@ def create_table_specification(username, password, hostname, port, service_name,
         port (int): 포트 번호
         service_name (str): 서비스 이름
         owner (str): 스키마 소유자
+        use_cache (bool): False이면 메타데이터 캐시를 사용하지 않고 항상 DB에서 조회
     """
     try:
-        # Thin 모드로 연결
+        # 모든 데이터 먼저 가져오기
         dsn = f"{hostname}:{port}/{service_name}"
-        connection = oracledb.connect(user=username,
-                                    password=password,
-                                    dsn=dsn,
-                                    config_dir=None,
-                                    lib_dir=None)
+        metadata = load_schema_metadata(username, password, dsn, owner, use_cache)
+        tables = metadata['tables']
+        table_comments = metadata['table_comments']
+        
+        # 컬럼 명세를 스키마 전체에 대해 한 번에 만든 뒤 테이블별로 분리
+        column_spec = build_column_info(metadata['columns'], metadata['fks'])
+        columns_by_table = {name: df for name, df in column_spec.groupby(level=0, sort=False)}
         
-        tables = get_tables(connection, owner)
+        # 31자로 잘리거나 대소문자만 다른 테이블 이름도 시트 이름이 겹치지 않도록 미리 배정
+        sheet_names = get_sheet_names(tables, reserved=('목차', 'Views'))
         
         # Excel 파일 생성
         output_file = get_output_file_name('oracle_tables')
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        with xlsxwriter.Workbook(output_file, WORKBOOK_OPTIONS) as workbook:
+            formats = create_sheet_formats(workbook)
+            
             for table_name in tables:
                 # 테이블 정보 수집
-                columns = get_column_info(connection, table_name, owner)
-                table_comment = get_table_comment(connection, table_name, owner)
-                
-                # DataFrame 생성
-                df = pd.DataFrame(columns)
-                
-                # 시트 이름으로 사용할 수 있는 길이로 조정
-                sheet_name = table_name[:31]  # Excel 시트 이름 제한
+                df = columns_by_table.get(table_name, column_spec.iloc[:0])
+                table_comment = table_comments.get(table_name, '')
                 
-                # DataFrame을 Excel 시트에 저장
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                # 시트 생성
+                ws = workbook.add_worksheet(sheet_names[table_name])
                 
-                # 시트 스타일 적용
-                ws = writer.sheets[sheet_name]
+                # 목차로 돌아가기 링크 추가 (constant_memory 모드에서는 위쪽 행부터 기록해야 함)
+                ws.write_url('A1', 'internal:목차!A1', formats['back_link'], string='목차로 돌아가기')
                 
-                # 목차로 돌아가기 링크 추가
-                ws['A1'] = '목차로 돌아가기'
-                ws['A1'].hyperlink = '#목차!A1'
-                ws['A1'].font = Font(color="0563C1", underline="single")
-                ws['A1'].alignment = Alignment(horizontal='left', vertical='center')
+                # 테이블 코멘트는 링크와 컬럼 정보 사이의 빈 행에 기록
+                if table_comment:
+                    ws.write_string('A2', f"테이블 설명: {table_comment}")
                 
-                # 스타일 적용
-                apply_sheet_style(ws, df)
+                # 스타일 적용 (링크 아래에 컬럼 정보 기록)
+                apply_sheet_style(ws, df, formats, startrow=2)
         
-        connection.close()
         print(f"오라클 테이블 명세서가 생성되었습니다: {output_file}")
         
     except Exception as e:
@@ -178,5 +272,6 @@ if __name__ == "__main__":
     port = 1521
     service_name = "service_name"
     owner = "SCHEMA_NAME"  # 스키마 이름을 대문자로 지정
+    use_cache = True  # False이면 메타데이터 캐시를 사용하지 않고 항상 DB에서 조회
     
-    create_table_specification(username, password, hostname, port, service_name, owner)
+    create_table_specification(username, password, hostname, port, service_name, owner, use_cache)